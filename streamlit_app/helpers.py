@@ -0,0 +1,58 @@
+"""
+Pure helpers shared by the GWAS Trait Extraction Viewer.
+
+Nothing here touches Streamlit or Snowflake, so it can be imported and tested
+without a running app or a connection.
+"""
+
+import json
+import re
+
+# =============================
+# 🧮 TRAIT HELPERS
+# =============================
+# found_trait_mask applies the same rule as the notebook's ACTUAL_FOUND_SQL, so the
+# sidebar's precomputed count and the page counts agree; change both together.
+
+# Trait fields counted as found/not found; the same columns the notebook's
+# ACTUAL_FOUND backfill (Precompute_Actual_Found) sums
+TRAIT_FIELDS = (
+    'TRAIT', 'GERMPLASM_NAME', 'GENOME_VERSION', 'CHROMOSOME', 'PHYSICAL_POSITION',
+    'GENE', 'SNP_NAME', 'VARIANT_ID', 'VARIANT_TYPE', 'EFFECT_SIZE',
+    'GWAS_MODEL', 'EVIDENCE_TYPE', 'ALLELE', 'ANNOTATION', 'CANDIDATE_REGION'
+)
+
+# Placeholder values the extractor writes instead of leaving a field empty
+MISSING_TRAIT_VALUES = frozenset({"NONE", "NULL", "NOT IN PAPER"})
+
+# NOT_FOUND / NOT FOUND / NOTFOUND markers, in any case
+NOT_FOUND_PATTERN = re.compile(r"NOT.?FOUND", re.IGNORECASE)
+
+def found_trait_mask(traits_row):
+    """Flag, per trait field, whether it holds a real value (not empty, NOT_FOUND or a placeholder)"""
+    values = traits_row.reindex(TRAIT_FIELDS).astype("string").str.strip("\"'").str.upper()
+    found = (
+        values.ne("")
+        & ~values.str.contains(NOT_FOUND_PATTERN, na=False)
+        & ~values.isin(MISSING_TRAIT_VALUES)
+    )
+    return found.fillna(False).astype(bool)
+
+# =============================
+# 🤖 CORTEX HELPERS
+# =============================
+def iter_sse_text(lines):
+    """Yield the text deltas carried by Cortex server-sent event lines"""
+    # One "data: {...}" line per chunk, terminated by "data: [DONE]"
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        choices = json.loads(data).get("choices") or []
+        if choices:
+            delta = choices[0].get("delta", {})
+            text = delta.get("content") or delta.get("text")
+            if text:
+                yield text
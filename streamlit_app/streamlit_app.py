@@ -9,8 +9,16 @@ Now with page-based navigation to prevent unwanted navigation during chat!
 import streamlit as st
 import pandas as pd
 import json
-from datetime import datetime
-from snowflake.snowpark.context import get_active_session
+import logging
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from jinja2 import Environment
+import requests
+
+from helpers import TRAIT_FIELDS, found_trait_mask, iter_sse_text
+
+logger = logging.getLogger(__name__)
 
 # =============================
 # 🎨 PAGE CONFIG & STYLING
@@ -22,312 +30,514 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for beautiful styling
-st.markdown("""
-<style>
-    /* Main theme colors */
-    :root {
-        --primary-color: #1f77b4;
-        --secondary-color: #2ca02c;
-        --accent-color: #ff7f0e;
-        --background-color: #f8f9fa;
-        --success-color: #28a745;
-        --warning-color: #ffc107;
-        --danger-color: #dc3545;
-    }
-    
-    /* Header styling */
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        color: white;
-        margin-bottom: 2rem;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    
-    .main-header h1 {
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 700;
-    }
-    
-    .main-header p {
-        margin: 0.5rem 0 0 0;
-        font-size: 1.1rem;
-        opacity: 0.9;
-    }
-    
-    /* Metric cards */
-    .metric-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 8px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        border-left: 4px solid var(--primary-color);
-        margin-bottom: 1rem;
-    }
-    
-    .metric-card h3 {
-        margin: 0 0 0.5rem 0;
-        color: #666;
-        font-size: 0.9rem;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-    }
-    
-    .metric-card p {
-        margin: 0;
-        font-size: 1.8rem;
-        font-weight: 700;
-        color: #333;
-    }
-    
-    /* Beautiful trait cards */
-    .trait-card {
-        background: white;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-        transition: all 0.3s ease;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .trait-card:hover {
-        box-shadow: 0 4px 16px rgba(0,0,0,0.12);
-        transform: translateY(-2px);
-    }
-    
-    .trait-card.found {
-        border-left: 4px solid var(--success-color);
-    }
-    
-    .trait-card.not-found {
-        border-left: 4px solid #dee2e6;
-        opacity: 0.85;
-    }
-    
-    .trait-header {
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-        margin-bottom: 0.75rem;
-    }
-    
-    .trait-icon {
-        font-size: 1.5rem;
-        opacity: 0.8;
-    }
-    
-    .trait-name {
-        font-size: 0.9rem;
-        font-weight: 600;
-        color: #495057;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin: 0;
-    }
-    
-    .trait-value {
-        font-size: 1.1rem;
-        font-weight: 600;
-        color: #212529;
-        margin: 0;
-        line-height: 1.4;
-        word-break: break-word;
-    }
-    
-    .trait-not-found {
-        font-size: 0.95rem;
-        color: #6c757d;
-        font-style: italic;
-        margin: 0;
-    }
-    
-    .trait-status {
-        position: absolute;
-        top: 0.75rem;
-        right: 0.75rem;
-        font-size: 0.75rem;
-        padding: 0.25rem 0.75rem;
-        border-radius: 20px;
-        font-weight: 500;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .trait-status.found {
-        background-color: #d4edda;
-        color: #155724;
-    }
-    
-    .trait-status.not-found {
-        background-color: #f8f9fa;
-        color: #6c757d;
-    }
-    
-    /* Stats section */
-    .stats-container {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-        border-radius: 12px;
-        padding: 2rem;
-        margin-bottom: 2rem;
-    }
-    
-    .stat-item {
-        text-align: center;
-        padding: 1rem;
-    }
-    
-    .stat-value {
-        font-size: 2.5rem;
-        font-weight: 700;
-        color: #2c3e50;
-        margin: 0;
-    }
-    
-    .stat-label {
-        font-size: 0.9rem;
-        color: #5a6c7d;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-        margin-top: 0.5rem;
-    }
-    
-    /* Section headers */
-    .section-header {
-        font-size: 1.5rem;
-        font-weight: 600;
-        color: #2c3e50;
-        margin-bottom: 1.5rem;
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-    }
-    
-    .section-header::after {
-        content: '';
-        flex: 1;
-        height: 2px;
-        background: linear-gradient(to right, #e9ecef, transparent);
-        margin-left: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data
+def load_css():
+    """Read the app stylesheet once per process"""
+    return (Path(__file__).parent / "styles.css").read_text()
+
+# Custom CSS for beautiful styling. Streamlit drops elements that a rerun does not
+# re-emit, so the style block is written every run; only the file read is cached.
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # =============================
 # 🔌 SNOWFLAKE CONNECTION
 # =============================
+# Result chunks downloaded in parallel for multi-row loaders (connector default is 4)
+CLIENT_PREFETCH_THREADS = 8
+
 @st.cache_resource
 def get_snowflake_connection():
     """Initialize Snowflake connection"""
-    return st.connection("snowflake")
+    connection = st.connection("snowflake")
+    connection.raw_connection.client_prefetch_threads = CLIENT_PREFETCH_THREADS
+    
+    # Serve repeat loads from Snowflake's 24h result cache; our SQL is constant
+    # text with bound parameters, so identical lookups hit it across users
+    try:
+        with connection.cursor() as cur:
+            cur.execute("ALTER SESSION SET USE_CACHED_RESULT = TRUE")
+    except Exception:
+        # Not permitted in every runtime; the account default still applies
+        logger.warning("Could not enable USE_CACHED_RESULT on the app session", exc_info=True)
+    
+    return connection
 
 conn = get_snowflake_connection()
 
+@st.cache_resource
+def get_snowpark_session():
+    """Snowpark session over the app connection, created once per process"""
+    return conn.session()
+
 # =============================
 # 📊 DATA LOADING FUNCTIONS
 # =============================
-@st.cache_data(ttl=600)
-def load_documents():
-    """Load all available documents"""
+# How long the data-version probe result is reused before Snowflake is asked again
+DATA_VERSION_TTL_SECONDS = 60
+
+@st.cache_data(ttl=DATA_VERSION_TTL_SECONDS, show_spinner=False)
+def data_version():
+    """Marker that changes whenever the extraction pipeline writes new data.
+
+    main() reads it once per rerun and passes it down as the loaders' ``version``
+    argument, so cached results stay valid until the data actually changes and one
+    rerun never mixes two snapshots.
+
+    Page and document tables are insert-only, so their row count plus newest
+    created_at tracks them. Trait rows are rewritten in place by the extraction
+    MERGE and the ACTUAL_FOUND backfill, so that (one row per document) table is
+    hashed instead. Unlike INFORMATION_SCHEMA.TABLES.LAST_ALTERED, none of this
+    moves on background maintenance, and the result cache can serve it.
+    """
+    query = """
+    SELECT
+        (SELECT COUNT(*) || '@' || COALESCE(MAX(created_at)::STRING, '') FROM GWAS.PDF_RAW.PARSED_DOCUMENTS),
+        (SELECT COUNT(*) || '@' || COALESCE(MAX(created_at)::STRING, '') FROM GWAS.PDF_PROCESSING.TEXT_PAGES),
+        (SELECT COUNT(*) || '@' || COALESCE(MAX(created_at)::STRING, '') FROM GWAS.PDF_PROCESSING.IMAGE_PAGES),
+        (SELECT COUNT(*) || '@' || COALESCE(MAX(created_at)::STRING, '') FROM GWAS.PDF_PROCESSING.MULTIMODAL_PAGES),
+        (SELECT COALESCE(HASH_AGG(*)::STRING, '') FROM GWAS.PDF_PROCESSING.GWAS_TRAIT_ANALYTICS)
+    """
+    return "|".join(str(marker) for marker in conn.query(query, ttl=0, show_spinner=False).iloc[0])
+
+# Loaders below are keyed on data_version() and run conn.query with ttl=0, which
+# bypasses conn.query's own indefinite memoization so a new version refetches.
+# Nothing expires on a timer, so each cache is bounded instead: entries for
+# superseded versions and documents nobody is viewing are evicted least-recently-used.
+DOCUMENT_LIST_CACHE_MAX_ENTRIES = 4
+DOCUMENT_CACHE_MAX_ENTRIES = 32
+PAGE_WINDOW_CACHE_MAX_ENTRIES = 128
+
+# Document list snapshots kept on disk, one per data version, so a restarted
+# process skips the V_DOCUMENT_SUMMARY query; only the newest few are kept
+DOCUMENT_SNAPSHOT_DIR = Path(".streamlit") / "cache" / "documents"
+DOCUMENT_SNAPSHOT_MAX_FILES = 4
+
+def _document_snapshot_path(version):
+    """Snapshot file for a data version"""
+    return DOCUMENT_SNAPSHOT_DIR / f"{hashlib.blake2b(version.encode(), digest_size=8).hexdigest()}.pkl"
+
+def _save_document_snapshot(snapshot, documents):
+    """Write a document list snapshot and prune all but the newest few"""
+    try:
+        DOCUMENT_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        documents.to_pickle(snapshot)
+        snapshots = sorted(DOCUMENT_SNAPSHOT_DIR.glob("*.pkl"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for stale in snapshots[DOCUMENT_SNAPSHOT_MAX_FILES:]:
+            stale.unlink(missing_ok=True)
+    except OSError:
+        logger.warning("Could not write the document list snapshot", exc_info=True)
+
+@st.cache_data(max_entries=DOCUMENT_LIST_CACHE_MAX_ENTRIES, show_spinner=False)
+def load_documents(version):
+    """Load all available documents, from this version's disk snapshot when one exists"""
+    snapshot = _document_snapshot_path(version)
+    if snapshot.exists():
+        try:
+            return pd.read_pickle(snapshot)
+        except Exception:
+            logger.warning("Ignoring unreadable document list snapshot %s", snapshot, exc_info=True)
+    
     query = """
     SELECT 
         DOCUMENT_ID as document_id,
         FILE_NAME as pdf_filename,
         TOTAL_PAGES as page_count,
         CREATED_AT as extraction_timestamp,
-        FILE_PATH as file_url
-    FROM GWAS.PDF_RAW.PARSED_DOCUMENTS
+        FILE_PATH as file_url,
+        ACTUAL_FOUND as actual_found,
+        ACTUAL_ACCURACY_PCT as actual_accuracy_pct,
+        EXTRACTION_SOURCE as extraction_source
+    FROM GWAS.PDF_PROCESSING.V_DOCUMENT_SUMMARY
     ORDER BY CREATED_AT DESC
     """
-    return conn.query(query)
+    # Indexed by id (column kept) so pages can look a document up with .loc
+    documents = conn.query(query, ttl=0).set_index('DOCUMENT_ID', drop=False)
+    _save_document_snapshot(snapshot, documents)
+    return documents
 
-@st.cache_data(ttl=600)
-def load_gwas_traits(document_id):
-    """Load GWAS traits for a specific document"""
-    query = f"""
-    SELECT 
-        trait,
-        germplasm_name,
-        genome_version,
-        chromosome,
-        physical_position,
-        gene,
-        snp_name,
-        variant_id,
-        variant_type,
-        effect_size,
-        gwas_model,
-        evidence_type,
-        allele,
-        annotation,
-        candidate_region,
-        extraction_source,
-        field_citations,
-        traits_extracted,
-        traits_not_reported,
-        extraction_accuracy_pct
-    FROM GWAS.PDF_PROCESSING.GWAS_TRAIT_ANALYTICS
-    WHERE document_id = '{document_id}'
+GWAS_TRAITS_QUERY = """
+SELECT 
+    trait,
+    germplasm_name,
+    genome_version,
+    chromosome,
+    physical_position,
+    gene,
+    snp_name,
+    variant_id,
+    variant_type,
+    effect_size,
+    gwas_model,
+    evidence_type,
+    allele,
+    annotation,
+    candidate_region,
+    extraction_source,
+    field_citations,
+    traits_extracted,
+    traits_not_reported,
+    extraction_accuracy_pct
+FROM GWAS.PDF_PROCESSING.GWAS_TRAIT_ANALYTICS
+WHERE document_id = ?
+"""
+
+# Trait cards on the Extracted Traits page, in display order: (label, column, icon)
+TRAIT_DISPLAY_FIELDS = (
+    ("Trait", "TRAIT", "🎯"),
+    ("Germplasm Name", "GERMPLASM_NAME", "🌱"),
+    ("Genome Version", "GENOME_VERSION", "🧬"),
+    ("Chromosome", "CHROMOSOME", "📍"),
+    ("Physical Position", "PHYSICAL_POSITION", "📏"),
+    ("Gene", "GENE", "🧪"),
+    ("SNP Name", "SNP_NAME", "🔬"),
+    ("Variant ID", "VARIANT_ID", "🆔"),
+    ("Variant Type", "VARIANT_TYPE", "🔀"),
+    ("Effect Size", "EFFECT_SIZE", "📈"),
+    ("GWAS Model", "GWAS_MODEL", "🧮"),
+    ("Allele", "ALLELE", "🔤"),
+    ("Annotation", "ANNOTATION", "📝"),
+    ("Candidate Region", "CANDIDATE_REGION", "🗺️"),
+)
+
+# FIELD_CITATIONS merge outcomes written by the notebook's merge step, in chart order;
+# "not_found" is left out because those fields were not extracted at all
+CITATION_SOURCE_LABELS = {
+    "phase1_only": "Phase 1 only (Text)",
+    "phase2_only": "Phase 2 only (Multimodal)",
+    "both_agree": "Both phases agree",
+    "phases_differ_p2": "Phases differ (Phase 2 used)",
+}
+
+DOCUMENT_PAGES_QUERY = """
+SELECT 
+    page_number,
+    page_text,
+    image_path,
+    has_text,
+    has_image
+FROM GWAS.PDF_PROCESSING.MULTIMODAL_PAGES
+WHERE document_id = ?
+ORDER BY page_number
+"""
+
+TEXT_PAGES_QUERY = """
+SELECT 
+    page_number,
+    LENGTH(page_text) as text_length
+FROM GWAS.PDF_PROCESSING.TEXT_PAGES
+WHERE document_id = ?
+ORDER BY page_number
+"""
+
+IMAGE_PAGES_QUERY = """
+SELECT 
+    page_number,
+    image_file_path as image_path
+FROM GWAS.PDF_PROCESSING.IMAGE_PAGES
+WHERE document_id = ?
+ORDER BY page_number
+"""
+
+
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES)
+def load_trait_details(document_id, version):
+    """Load the full GWAS trait row for a document (detail pages only)"""
+    return conn.query(GWAS_TRAITS_QUERY, ttl=0, params=[document_id])
+
+
+# Pages fetched per Page Browser request; windows are aligned so neighbouring
+# pages share one cache entry
+PAGE_WINDOW_SIZE = 10
+
+# Characters of page text shipped to the Page Browser preview
+PAGE_PREVIEW_CHARS = 2000
+
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES)
+def load_page_numbers(document_id, version):
+    """Load just the page numbers of a document's multimodal pages"""
+    query = """
+    SELECT page_number
+    FROM GWAS.PDF_PROCESSING.MULTIMODAL_PAGES
+    WHERE document_id = ?
+    ORDER BY page_number
     """
-    return conn.query(query)
+    return conn.query(query, ttl=0, params=[document_id])['PAGE_NUMBER'].tolist()
 
-@st.cache_data(ttl=600)
-def load_document_pages(document_id):
-    """Load multimodal pages for a document"""
-    query = f"""
+@st.cache_data(max_entries=PAGE_WINDOW_CACHE_MAX_ENTRIES)
+def load_document_pages(document_id, version, page_start, page_count=PAGE_WINDOW_SIZE):
+    """Load one window of multimodal pages for a document, with text truncated to a preview"""
+    query = """
     SELECT 
         page_number,
-        page_text,
+        LEFT(page_text, ?) as page_text_preview,
+        LENGTH(page_text) as text_length,
         image_path,
         has_text,
         has_image
     FROM GWAS.PDF_PROCESSING.MULTIMODAL_PAGES
-    WHERE document_id = '{document_id}'
+    WHERE document_id = ?
+        AND page_number BETWEEN ? AND ?
     ORDER BY page_number
     """
-    return conn.query(query)
+    page_end = page_start + page_count - 1
+    return conn.query(query, ttl=0, params=[PAGE_PREVIEW_CHARS, document_id, page_start, page_end])
 
-@st.cache_data(ttl=600)
-def load_text_pages(document_id):
-    """Load text pages for analytics"""
-    query = f"""
-    SELECT 
-        page_number,
-        LENGTH(page_text) as text_length
-    FROM GWAS.PDF_PROCESSING.TEXT_PAGES
-    WHERE document_id = '{document_id}'
-    ORDER BY page_number
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES)
+def load_all_document_pages(document_id, version):
+    """Load every multimodal page of a document, full text included (Raw Data only)"""
+    return conn.query(DOCUMENT_PAGES_QUERY, ttl=0, params=[document_id])
+
+# Page images held in memory across all documents and versions
+PAGE_IMAGE_CACHE_MAX_ENTRIES = 128
+
+@st.cache_data(max_entries=PAGE_IMAGE_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_page_image_bytes(image_path, version):
+    """Read a page image from the PDF stage, or None if no scoped URL is returned"""
+    from snowflake.snowpark.files import SnowflakeFile
+    
+    session = get_snowpark_session()
+    result = session.sql(
+        "SELECT BUILD_SCOPED_FILE_URL(@GWAS.PDF_RAW.PDF_STAGE, ?) as scoped_url",
+        params=[image_path]
+    ).collect()
+    
+    if not result or not result[0]['SCOPED_URL']:
+        return None
+    
+    with SnowflakeFile.open(result[0]['SCOPED_URL'], 'rb') as f:
+        return f.read()
+
+
+@dataclass
+class DocBundle:
+    """Per-document page statistics frames, fetched together"""
+    text_pages: pd.DataFrame
+    image_pages: pd.DataFrame
+
+
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES)
+def load_document_bundle(document_id, version):
+    """Load text-page lengths and image pages for a document concurrently.
+
+    Both queries are submitted asynchronously on a single cursor so they run
+    concurrently in the warehouse; results are then collected by query id.
+    """
+    queries = {
+        "text_pages": TEXT_PAGES_QUERY,
+        "image_pages": IMAGE_PAGES_QUERY,
+    }
+    with conn.cursor() as cur:
+        query_ids = {}
+        for name, query in queries.items():
+            cur.execute_async(query, [document_id])
+            query_ids[name] = cur.sfqid
+        
+        frames = {}
+        for name, query_id in query_ids.items():
+            cur.get_results_from_sfqid(query_id)
+            frames[name] = cur.fetch_pandas_all()
+    
+    return DocBundle(**frames)
+
+# Most recent documents whose trait data is warmed after each page render
+PREFETCH_DOCUMENT_COUNT = 3
+
+def prefetch_documents(version):
+    """Populate the trait caches for the most recent documents.
+
+    Runs on the script thread at the end of the rerun, after the page is drawn, so
+    the loaders keep their ScriptRunContext and the shared connection is never used
+    concurrently. Once warm, each call is only cache hits.
     """
-    return conn.query(query)
+    documents = load_documents(version)
+    for document_id in documents['DOCUMENT_ID'].head(PREFETCH_DOCUMENT_COUNT):
+        load_trait_details(document_id, version)
 
-@st.cache_data(ttl=600)
-def load_image_pages(document_id):
-    """Load image pages for analytics"""
-    query = f"""
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_traits_csv(document_id, version):
+    """CSV bytes for the Raw Data traits download"""
+    return load_trait_details(document_id, version).to_csv(index=False).encode("utf-8")
+
+@st.cache_data(max_entries=DOCUMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_pages_csv(document_id, version):
+    """CSV bytes for the Raw Data pages download"""
+    return load_all_document_pages(document_id, version).to_csv(index=False).encode("utf-8")
+
+# =============================
+# 🧱 HTML TEMPLATES
+# =============================
+# Compiled once at import; autoescape keeps extracted values from injecting markup
+HTML_TEMPLATES = Environment(autoescape=True)
+
+# Trait cards for the Extracted Traits page, laid out two per row by .trait-grid
+TRAIT_GRID_TEMPLATE = HTML_TEMPLATES.from_string("""\
+<div class="trait-grid">
+{%- for t in traits %}
+<div class="trait-card {{ 'found' if t.found else 'not-found' }}">
+    <div class="trait-status {{ 'found' if t.found else 'not-found' }}">{{ 'Found' if t.found else 'Not Found' }}</div>
+    <div class="trait-header">
+        <span class="trait-icon">{{ t.icon }}</span>
+        <h4 class="trait-name">{{ t.label }}</h4>
+    </div>
+    {%- if t.found %}
+    <p class="trait-value">{{ t.value }}</p>
+    {%- else %}
+    <p class="trait-not-found">Not reported in paper</p>
+    {%- endif %}
+</div>
+{%- endfor %}
+</div>
+""")
+
+# One row of metric cards; compact shrinks the values for text rather than numbers
+METRIC_STRIP_TEMPLATE = HTML_TEMPLATES.from_string("""\
+<div class="metric-strip" style="grid-template-columns: repeat({{ cards|length }}, 1fr);">
+{%- for card in cards %}
+<div class="metric-card">
+    <h3>{{ card.title }}</h3>
+    <p{% if compact %} style="font-size: 1.1rem;"{% endif %}>{{ card.value }}</p>
+</div>
+{%- endfor %}
+</div>
+""")
+
+# =============================
+# 🤖 CORTEX HELPERS
+# =============================
+CORTEX_COMPLETE_PATH = "/api/v2/cortex/inference:complete"
+
+# Blocking fallback when the REST endpoint cannot be used
+CORTEX_COMPLETE_QUERY = "SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) as response"
+
+# (connect, read) seconds: an unreachable account host fails fast, while a long
+# answer may still take a while between streamed chunks
+CORTEX_STREAM_TIMEOUT_SECONDS = (5, 120)
+
+# Failures that mean the REST stream is unusable: transport and HTTP errors, a
+# connection without host/token attributes (e.g. Streamlit in Snowflake), and
+# event payloads that are not valid JSON or not the expected shape
+CORTEX_REST_FALLBACK_ERRORS = (
+    requests.RequestException, AttributeError, TypeError, ValueError, KeyError, IndexError
+)
+
+def _stream_cortex_rest(model, prompt):
+    """Stream COMPLETE output from the Cortex REST API"""
+    connection = get_snowpark_session().connection
+    with requests.post(
+        f"https://{connection.host}{CORTEX_COMPLETE_PATH}",
+        headers={
+            "Authorization": f'Snowflake Token="{connection.rest.token}"',
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        },
+        json={
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        },
+        stream=True,
+        timeout=CORTEX_STREAM_TIMEOUT_SECONDS,
+    ) as response:
+        response.raise_for_status()
+        # The event stream carries no charset, which requests would read as ISO-8859-1
+        response.encoding = "utf-8"
+        yield from iter_sse_text(response.iter_lines(decode_unicode=True))
+
+def stream_cortex_complete(model, prompt):
+    """Yield Cortex COMPLETE output as it is generated.
+
+    Streams from the REST API when it is usable. If it fails before any text arrives,
+    the blocking SQL COMPLETE call answers instead, in one piece. When the endpoint
+    cannot be reached at all, that is remembered for the session so later turns go
+    straight to SQL instead of waiting on the connect timeout again.
+    """
+    if not st.session_state.get("cortex_rest_unavailable"):
+        streamed = False
+        try:
+            for text in _stream_cortex_rest(model, prompt):
+                streamed = True
+                yield text
+            return
+        except CORTEX_REST_FALLBACK_ERRORS as exc:
+            if streamed:
+                raise
+            logger.warning("Cortex REST streaming failed; falling back to SQL COMPLETE", exc_info=True)
+            # An HTTP error means the endpoint is reachable, so keep trying it next turn
+            if not isinstance(exc, requests.HTTPError):
+                st.session_state.cortex_rest_unavailable = True
+    
+    llm_result = get_snowpark_session().sql(CORTEX_COMPLETE_QUERY, params=[model, prompt]).collect()
+    if llm_result and llm_result[0]['RESPONSE']:
+        yield llm_result[0]['RESPONSE']
+
+# Chat search results kept per session; the least recently asked is evicted first
+SEARCH_CACHE_MAX_ENTRIES = 32
+
+def search_document_context(question, document_id, limit):
+    """Vector-search a document's pages for a question.
+
+    Returns the prompt context (page-tagged text) and a "Page n, ..." sources string.
+    """
+    session = get_snowpark_session()
+    
+    # Step 1: Embed the question once with AI_EMBED; the same vector
+    # queries both the text and image embedding indexes
+    embed_query = "SELECT AI_EMBED('voyage-multimodal-3', ?) as query_vector"
+    embedding_results = session.sql(embed_query, params=[question]).collect()
+    # VECTOR columns can come back as a JSON array string rather than a list
+    query_vector = embedding_results[0]['QUERY_VECTOR']
+    if isinstance(query_vector, str):
+        query_vector = json.loads(query_vector)
+    query_vector = [float(x) for x in query_vector]
+    
+    # Step 2: Build the multi_index_query payload and bind it as one JSON string
+    payload = {
+        "multi_index_query": {
+            "page_text": {"text": question},
+            "text_embedding": {"vector": query_vector},
+            "image_embedding": {"vector": query_vector}
+        },
+        "columns": ["page_text", "page_number"],
+        "limit": limit,
+        "filter": {"@eq": {"document_id": document_id}}
+    }
+    
+    search_query = """
     SELECT 
-        page_number,
-        image_file_path as image_path
-    FROM GWAS.PDF_PROCESSING.IMAGE_PAGES
-    WHERE document_id = '{document_id}'
-    ORDER BY page_number
+        result.value:page_text::STRING AS page_text,
+        result.value:page_number::INT AS page_number
+    FROM TABLE(
+        FLATTEN(
+            PARSE_JSON(
+                SNOWFLAKE.CORTEX.SEARCH_PREVIEW(
+                    'GWAS.PDF_PROCESSING.MULTIMODAL_SEARCH_SERVICE',
+                    ?
+                )
+            )['results']
+        )
+    ) AS result
     """
-    return conn.query(query)
+    
+    search_df = session.sql(search_query, params=[json.dumps(payload)]).to_pandas()
+    
+    # Build context from search results
+    page_labels = search_df['PAGE_NUMBER'].astype('Int64').astype('string').fillna('Unknown')
+    context_str = ("[Page " + page_labels + "]: " + search_df['PAGE_TEXT'].astype('string').fillna('') + "\n\n").str.cat()
+    page_refs = search_df['PAGE_NUMBER'].dropna().astype(int).unique().tolist()
+    
+    page_refs_str = ", ".join(f"Page {p}" for p in sorted(page_refs))
+    return context_str, page_refs_str
 
 # =============================
 # 🗂️ DOCUMENT SELECTOR (SHARED)
 # =============================
-def render_document_selector():
+def render_document_selector(version):
     """Render document selector in sidebar - shared across all pages"""
     with st.sidebar:
         st.markdown("### 📁 Document Selection")
         
         # Load documents
-        documents = load_documents()
+        documents = load_documents(version)
         
         if documents.empty:
             st.warning("⚠️ No documents found in the database.")
@@ -338,33 +548,51 @@ def render_document_selector():
         if "selected_doc_id" not in st.session_state:
             st.session_state.selected_doc_id = documents.iloc[0]['DOCUMENT_ID']
         
-        # Document selector
-        doc_options = {
-            f"{row['PDF_FILENAME']} ({row['DOCUMENT_ID'][:8]}...)": row['DOCUMENT_ID'] 
-            for _, row in documents.iterrows()
-        }
-        
-        # Find current selection index
-        current_doc_labels = [label for label, doc_id in doc_options.items() 
-                             if doc_id == st.session_state.selected_doc_id]
-        current_index = list(doc_options.keys()).index(current_doc_labels[0]) if current_doc_labels else 0
+        # Document selector: options are ids, labels are only used for display
+        doc_ids = documents['DOCUMENT_ID'].tolist()
+        doc_labels = documents['PDF_FILENAME'] + " (" + documents['DOCUMENT_ID'].str[:8] + "...)"
+        label_by_id = dict(zip(doc_ids, doc_labels))
+        position_by_id = {doc_id: pos for pos, doc_id in enumerate(doc_ids)}
         
-        selected_doc_label = st.selectbox(
+        selected_doc_id = st.selectbox(
             "Choose a document:",
-            options=list(doc_options.keys()),
-            index=current_index,
+            options=doc_ids,
+            index=position_by_id.get(st.session_state.selected_doc_id, 0),
+            format_func=label_by_id.get,
             key="doc_selector"
         )
         
         # Update session state when selection changes
-        st.session_state.selected_doc_id = doc_options[selected_doc_label]
+        st.session_state.selected_doc_id = selected_doc_id
         
         # Document info card
-        doc_info = documents[documents['DOCUMENT_ID'] == st.session_state.selected_doc_id].iloc[0]
+        doc_info = documents.loc[selected_doc_id]
+        
+        # Stats come precomputed from V_DOCUMENT_SUMMARY (null when no traits extracted yet)
+        stats_html = ""
+        if pd.notna(doc_info['ACTUAL_FOUND']):
+            actual_found = int(doc_info['ACTUAL_FOUND'])
+            total_traits = len(TRAIT_FIELDS)
+            actual_accuracy = doc_info['ACTUAL_ACCURACY_PCT']
+            source = doc_info['EXTRACTION_SOURCE'].replace('_', ' ').title()
+            stats_html = f"""
+        <div class="metric-card">
+            <h3>Traits Extracted</h3>
+            <p>{actual_found}/{total_traits}</p>
+        </div>
+        <div class="metric-card">
+            <h3>Accuracy</h3>
+            <p>{actual_accuracy:.1f}%</p>
+        </div>
+        <div class="metric-card">
+            <h3>Source</h3>
+            <p style="font-size: 1rem;">{source}</p>
+        </div>"""
         
-        st.markdown("---")
-        st.markdown("### 📄 Document Info")
+        # Info, stats and download headings are emitted as a single element per rerun
         st.markdown(f"""
+        <hr/>
+        <h3>📄 Document Info</h3>
         <div class="metric-card">
             <h3>Filename</h3>
             <p style="font-size: 1rem;">{doc_info['PDF_FILENAME']}</p>
@@ -377,43 +605,13 @@ def render_document_selector():
             <h3>Extracted</h3>
             <p style="font-size: 1rem;">{doc_info['EXTRACTION_TIMESTAMP'].strftime('%Y-%m-%d')}</p>
         </div>
+        <hr/>
+        <h3>🔍 Quick Stats</h3>{stats_html}
+        <hr/>
+        <h3>📥 Download</h3>
         """, unsafe_allow_html=True)
         
-        st.markdown("---")
-        st.markdown("### 🔍 Quick Stats")
-        
-        # Load stats
-        traits_df = load_gwas_traits(st.session_state.selected_doc_id)
-        
-        if not traits_df.empty:
-            traits_row = traits_df.iloc[0]
-            
-            # Recalculate accurate count (excluding NOT_FOUND)
-            trait_field_names = [
-                'TRAIT', 'GERMPLASM_NAME', 'GENOME_VERSION', 'CHROMOSOME', 'PHYSICAL_POSITION',
-                'GENE', 'SNP_NAME', 'VARIANT_ID', 'VARIANT_TYPE', 'EFFECT_SIZE',
-                'GWAS_MODEL', 'EVIDENCE_TYPE', 'ALLELE', 'ANNOTATION', 'CANDIDATE_REGION'
-            ]
-            
-            actual_found = 0
-            for field in trait_field_names:
-                value = traits_row.get(field)
-                if value:
-                    value_str = str(value).strip('"').strip("'")
-                    if value_str and "NOT_FOUND" not in value_str.upper():
-                        actual_found += 1
-            
-            total_traits = len(trait_field_names)
-            actual_accuracy = (actual_found / total_traits) * 100
-            
-            st.metric("Traits Extracted", f"{actual_found}/{total_traits}")
-            st.metric("Accuracy", f"{actual_accuracy:.1f}%")
-            st.metric("Source", traits_row['EXTRACTION_SOURCE'].replace('_', ' ').title())
-        
         # Download PDF button
-        st.markdown("---")
-        st.markdown("### 📥 Download")
-        
         if st.button("📄 Download PDF", use_container_width=True):
             pdf_url = doc_info['FILE_URL']
             st.info(f"📁 PDF Location:\n`{pdf_url}`")
@@ -426,33 +624,22 @@ def render_document_selector():
 # 📄 PAGE FUNCTIONS
 # =============================
 
-def page_extracted_traits():
+def page_extracted_traits(version):
     """Page 1: Extracted Traits"""
-    traits_df = load_gwas_traits(st.session_state.selected_doc_id)
+    traits_df = load_trait_details(st.session_state.selected_doc_id, version)
     
     if traits_df.empty:
         st.warning("⚠️ No trait data found for this document.")
         return
     
     traits_row = traits_df.iloc[0]
+    row = traits_row.to_dict()
     
     # Recalculate actual traits found (excluding NOT_FOUND values)
-    trait_field_names = [
-        'TRAIT', 'GERMPLASM_NAME', 'GENOME_VERSION', 'CHROMOSOME', 'PHYSICAL_POSITION',
-        'GENE', 'SNP_NAME', 'VARIANT_ID', 'VARIANT_TYPE', 'EFFECT_SIZE',
-        'GWAS_MODEL', 'EVIDENCE_TYPE', 'ALLELE', 'ANNOTATION', 'CANDIDATE_REGION'
-    ]
-    
-    actual_found = 0
-    for field in trait_field_names:
-        value = traits_row.get(field)
-        if value:
-            value_str = str(value).strip('"').strip("'")
-            is_valid = value_str and "NOT_FOUND" not in value_str.upper() and "NOT FOUND" not in value_str.upper()
-            if is_valid:
-                actual_found += 1
+    found_mask = found_trait_mask(traits_row)
+    actual_found = int(found_mask.sum())
     
-    total_traits = len(trait_field_names)
+    total_traits = len(TRAIT_FIELDS)
     actual_accuracy = (actual_found / total_traits) * 100 if total_traits > 0 else 0
     
     # Beautiful stats section
@@ -481,138 +668,65 @@ def page_extracted_traits():
         actual_found, total_traits,
         actual_accuracy,
         total_traits - actual_found,
-        traits_row['EVIDENCE_TYPE'] or "GWAS"
+        row['EVIDENCE_TYPE'] or "GWAS"
     ), unsafe_allow_html=True)
     
     # Section header
     st.markdown('<h3 class="section-header">🧬 Extracted Genomic Data</h3>', unsafe_allow_html=True)
     
-    # Define trait display order and labels
-    trait_fields = [
-        ("Trait", "trait", "🎯"),
-        ("Germplasm Name", "germplasm_name", "🌱"),
-        ("Genome Version", "genome_version", "🧬"),
-        ("Chromosome", "chromosome", "📍"),
-        ("Physical Position", "physical_position", "📏"),
-        ("Gene", "gene", "🧪"),
-        ("SNP Name", "snp_name", "🔬"),
-        ("Variant ID", "variant_id", "🆔"),
-        ("Variant Type", "variant_type", "🔀"),
-        ("Effect Size", "effect_size", "📈"),
-        ("GWAS Model", "gwas_model", "🧮"),
-        ("Allele", "allele", "🔤"),
-        ("Annotation", "annotation", "📝"),
-        ("Candidate Region", "candidate_region", "🗺️")
-    ]
-    
     # Parse citations
     try:
-        citations = json.loads(traits_row['FIELD_CITATIONS']) if traits_row['FIELD_CITATIONS'] else {}
+        citations = json.loads(row['FIELD_CITATIONS']) if row['FIELD_CITATIONS'] else {}
     except:
         citations = {}
     
-    # Display traits in a beautiful 2-column grid with HTML
-    col1, col2 = st.columns(2)
-    
-    for idx, (label, field, icon) in enumerate(trait_fields):
-        col = col1 if idx % 2 == 0 else col2
-        
-        value = traits_row[field.upper()]
-        
-        # Clean up value - strip quotes and check for NOT_FOUND
-        if value:
-            value = str(value).strip('"').strip("'")
-        
-        # Check if value is actually missing
-        is_missing = (
-            not value or 
-            value == "Not in paper" or
-            "NOT_FOUND" in value.upper() or
-            "NOT FOUND" in value.upper() or
-            value == "None" or
-            value == "NULL"
-        )
-        
-        # Create beautiful trait card
-        with col:
-            if is_missing:
-                st.markdown(f"""
-                <div class="trait-card not-found">
-                    <div class="trait-status not-found">Not Found</div>
-                    <div class="trait-header">
-                        <span class="trait-icon">{icon}</span>
-                        <h4 class="trait-name">{label}</h4>
-                    </div>
-                    <p class="trait-not-found">Not reported in paper</p>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="trait-card found">
-                    <div class="trait-status found">Found</div>
-                    <div class="trait-header">
-                        <span class="trait-icon">{icon}</span>
-                        <h4 class="trait-name">{label}</h4>
-                    </div>
-                    <p class="trait-value">{value}</p>
-                </div>
-                """, unsafe_allow_html=True)
+    # Display traits in a beautiful 2-column grid with HTML, rendered in one pass
+    traits = [
+        {
+            "label": label,
+            "icon": icon,
+            "value": str(row[field]).strip('"').strip("'"),
+            "found": bool(found_mask[field]),
+        }
+        for label, field, icon in TRAIT_DISPLAY_FIELDS
+    ]
+    st.markdown(TRAIT_GRID_TEMPLATE.render(traits=traits), unsafe_allow_html=True)
     
     # Additional info section
     st.markdown('<h3 class="section-header">📊 Extraction Metadata</h3>', unsafe_allow_html=True)
     
-    metadata_cols = st.columns(3)
+    source = "Multimodal Pipeline" if row['EXTRACTION_SOURCE'] == 'multimodal_pipeline' else "Text-Only Pipeline"
     
-    with metadata_cols[0]:
-        source = "Multimodal Pipeline" if traits_row['EXTRACTION_SOURCE'] == 'multimodal_pipeline' else "Text-Only Pipeline"
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3>Extraction Source</h3>
-            <p style="font-size: 1.1rem;">{source}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with metadata_cols[1]:
-        confidence_text = traits_row.get('FIELD_CITATIONS', 'N/A')
-        if confidence_text and confidence_text != 'N/A':
-            # Try to extract confidence summary
-            if 'HIGH' in confidence_text:
-                conf_parts = confidence_text.split()
-                conf_summary = ' '.join(conf_parts[:3]) if len(conf_parts) > 3 else confidence_text[:20]
-            else:
-                conf_summary = confidence_text[:30]
+    confidence_text = row.get('FIELD_CITATIONS', 'N/A')
+    if confidence_text and confidence_text != 'N/A':
+        # Try to extract confidence summary
+        if 'HIGH' in confidence_text:
+            conf_parts = confidence_text.split()
+            conf_summary = ' '.join(conf_parts[:3]) if len(conf_parts) > 3 else confidence_text[:20]
         else:
-            conf_summary = 'Not available'
-        
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3>Confidence Summary</h3>
-            <p style="font-size: 1.1rem;">{conf_summary}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with metadata_cols[2]:
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3>Traits Extracted</h3>
-            <p style="font-size: 1.1rem;">{traits_row['TRAITS_EXTRACTED']}/{total_traits}</p>
-        </div>
-        """, unsafe_allow_html=True)
-
+            conf_summary = confidence_text[:30]
+    else:
+        conf_summary = 'Not available'
+    
+    metadata_cards = [
+        {"title": "Extraction Source", "value": source},
+        {"title": "Confidence Summary", "value": conf_summary},
+        {"title": "Traits Extracted", "value": f"{row['TRAITS_EXTRACTED']}/{total_traits}"},
+    ]
+    st.markdown(METRIC_STRIP_TEMPLATE.render(cards=metadata_cards, compact=True), unsafe_allow_html=True)
 
-def page_browser():
+def page_browser(version):
     """Page 2: Page Browser"""
     st.markdown("## 📄 Page Browser")
     st.markdown("*Explore individual pages with text and images*")
     
-    pages_df = load_document_pages(st.session_state.selected_doc_id)
+    page_numbers = load_page_numbers(st.session_state.selected_doc_id, version)
     
-    if pages_df.empty:
+    if not page_numbers:
         st.warning("⚠️ No page data found for this document.")
         return
     
     # Page selector
-    page_numbers = sorted(pages_df['PAGE_NUMBER'].unique())
     selected_page = st.selectbox(
         "Select page:",
         options=page_numbers,
@@ -620,6 +734,9 @@ def page_browser():
         key="page_selector"
     )
     
+    # Only the window containing the selected page is fetched
+    window_start = selected_page - selected_page % PAGE_WINDOW_SIZE
+    pages_df = load_document_pages(st.session_state.selected_doc_id, version, window_start)
     page_data = pages_df[pages_df['PAGE_NUMBER'] == selected_page].iloc[0]
     
     # Display page content
@@ -627,11 +744,11 @@ def page_browser():
     
     with col1:
         st.markdown("### 📝 Page Text")
-        if page_data['HAS_TEXT'] and page_data['PAGE_TEXT']:
+        if page_data['HAS_TEXT'] and page_data['PAGE_TEXT_PREVIEW']:
             with st.expander("View full text", expanded=True):
                 st.text_area(
                     "Text content:",
-                    value=page_data['PAGE_TEXT'][:2000] + "..." if len(page_data['PAGE_TEXT']) > 2000 else page_data['PAGE_TEXT'],
+                    value=page_data['PAGE_TEXT_PREVIEW'] + "..." if page_data['TEXT_LENGTH'] > PAGE_PREVIEW_CHARS else page_data['PAGE_TEXT_PREVIEW'],
                     height=400,
                     key=f"text_{selected_page}",
                     label_visibility="collapsed"
@@ -643,29 +760,13 @@ def page_browser():
         st.markdown("### 🖼️ Page Image")
         if page_data['HAS_IMAGE'] and page_data['IMAGE_PATH']:
             try:
-                from snowflake.snowpark.files import SnowflakeFile
-                import io
-                
-                # Get Snowpark session
-                session = get_active_session()
-                
                 # Clean up image path (remove any @ prefix if present)
                 image_path = page_data['IMAGE_PATH'].lstrip('@')
                 
-                # Build scoped file URL for SnowflakeFile
-                scoped_url_query = f"""
-                SELECT BUILD_SCOPED_FILE_URL(@GWAS.PDF_RAW.PDF_STAGE, '{image_path}') as scoped_url
-                """
+                # Scoped URL + stage read, cached per image
+                image_bytes = get_page_image_bytes(image_path, version)
                 
-                result = session.sql(scoped_url_query).collect()
-                
-                if result and result[0]['SCOPED_URL']:
-                    scoped_url = result[0]['SCOPED_URL']
-                    
-                    # Read image file as bytes using SnowflakeFile
-                    with SnowflakeFile.open(scoped_url, 'rb') as f:
-                        image_bytes = f.read()
-                    
+                if image_bytes is not None:
                     # Display the image using bytes
                     st.image(image_bytes, use_container_width=True, caption=f"Page {selected_page}")
                     
@@ -694,7 +795,7 @@ def page_browser():
         st.metric("Page Number", selected_page)
     
     with stat_col2:
-        text_len = len(page_data['PAGE_TEXT']) if page_data['PAGE_TEXT'] else 0
+        text_len = int(page_data['TEXT_LENGTH']) if pd.notna(page_data['TEXT_LENGTH']) else 0
         st.metric("Text Length", f"{text_len:,} chars")
     
     with stat_col3:
@@ -702,19 +803,20 @@ def page_browser():
         st.metric("Status", status)
 
 
-def page_analytics():
+def page_analytics(version):
     """Page 3: Analytics Dashboard"""
     st.markdown("## 📊 Analytics Dashboard")
     
-    traits_df = load_gwas_traits(st.session_state.selected_doc_id)
+    traits_df = load_trait_details(st.session_state.selected_doc_id, version)
     
     if traits_df.empty:
         st.warning("⚠️ No analytics data available.")
         return
     
     traits_row = traits_df.iloc[0]
-    documents = load_documents()
-    doc_info = documents[documents['DOCUMENT_ID'] == st.session_state.selected_doc_id].iloc[0]
+    row = traits_row.to_dict()
+    documents = load_documents(version)
+    doc_info = documents.loc[st.session_state.selected_doc_id].to_dict()
     
     # Extraction summary
     col1, col2 = st.columns(2)
@@ -723,21 +825,9 @@ def page_analytics():
         st.markdown("### 🎯 Extraction Summary")
         
         # Recalculate accurate counts (excluding NOT_FOUND)
-        trait_field_names = [
-            'TRAIT', 'GERMPLASM_NAME', 'GENOME_VERSION', 'CHROMOSOME', 'PHYSICAL_POSITION',
-            'GENE', 'SNP_NAME', 'VARIANT_ID', 'VARIANT_TYPE', 'EFFECT_SIZE',
-            'GWAS_MODEL', 'EVIDENCE_TYPE', 'ALLELE', 'ANNOTATION', 'CANDIDATE_REGION'
-        ]
-        
-        extracted = 0
-        for field in trait_field_names:
-            value = traits_row.get(field)
-            if value:
-                value_str = str(value).strip('"').strip("'")
-                if value_str and "NOT_FOUND" not in value_str.upper():
-                    extracted += 1
+        extracted = int(found_trait_mask(traits_row).sum())
         
-        not_reported = len(trait_field_names) - extracted
+        not_reported = len(TRAIT_FIELDS) - extracted
         
         summary_df = pd.DataFrame({
             'Status': ['Extracted', 'Not Reported'],
@@ -745,25 +835,25 @@ def page_analytics():
         })
         
         st.bar_chart(summary_df.set_index('Status'))
-        st.metric("Extraction Accuracy", f"{traits_row['EXTRACTION_ACCURACY_PCT']:.1f}%")
+        st.metric("Extraction Accuracy", f"{row['EXTRACTION_ACCURACY_PCT']:.1f}%")
     
     with col2:
         st.markdown("### 📈 Extraction Sources")
         
         # Parse citations to count sources
         try:
-            citations = json.loads(traits_row['FIELD_CITATIONS']) if traits_row['FIELD_CITATIONS'] else {}
+            citations = json.loads(row['FIELD_CITATIONS']) if row['FIELD_CITATIONS'] else {}
             
-            phase1_count = sum(1 for v in citations.values() if 'Phase1' in str(v))
-            phase2_count = sum(1 for v in citations.values() if 'Phase2' in str(v))
-            llm_count = sum(1 for v in citations.values() if 'LLM' in str(v))
+            citation_sources = pd.Series([str(v) for v in citations.values()], dtype="string")
+            counts = citation_sources.str.strip().str.lower().value_counts()
             
             sources_df = pd.DataFrame({
-                'Source': ['Phase 1 (Text)', 'Phase 2 (Multimodal)', 'LLM Tie-Breaker'],
-                'Count': [phase1_count, phase2_count, llm_count]
+                'Source': list(CITATION_SOURCE_LABELS.values()),
+                'Fields': [int(counts.get(key, 0)) for key in CITATION_SOURCE_LABELS]
             })
             
             st.bar_chart(sources_df.set_index('Source'))
+            st.caption("Extracted fields by merge outcome; each field is counted once and not-found fields are excluded.")
             
         except Exception as e:
             st.warning("Could not parse citation data")
@@ -772,23 +862,19 @@ def page_analytics():
     st.markdown("---")
     st.markdown("### 📄 Document Processing Stats")
     
-    text_pages_df = load_text_pages(st.session_state.selected_doc_id)
-    image_pages_df = load_image_pages(st.session_state.selected_doc_id)
-    pages_df = load_document_pages(st.session_state.selected_doc_id)
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("Total Pages", doc_info['PAGE_COUNT'])
-    
-    with col2:
-        st.metric("Text Pages", len(text_pages_df))
-    
-    with col3:
-        st.metric("Image Pages", len(image_pages_df))
-    
-    with col4:
-        st.metric("Multimodal Pages", len(pages_df))
+    # Page text never leaves Snowflake here: only lengths, image paths and page numbers
+    bundle = load_document_bundle(st.session_state.selected_doc_id, version)
+    text_pages_df = bundle.text_pages
+    image_pages_df = bundle.image_pages
+    multimodal_page_count = len(load_page_numbers(st.session_state.selected_doc_id, version))
+    
+    page_cards = [
+        {"title": "Total Pages", "value": doc_info['PAGE_COUNT']},
+        {"title": "Text Pages", "value": len(text_pages_df)},
+        {"title": "Image Pages", "value": len(image_pages_df)},
+        {"title": "Multimodal Pages", "value": multimodal_page_count},
+    ]
+    st.markdown(METRIC_STRIP_TEMPLATE.render(cards=page_cards), unsafe_allow_html=True)
     
     # Text length distribution
     if not text_pages_df.empty:
@@ -796,15 +882,15 @@ def page_analytics():
         st.line_chart(text_pages_df.set_index('PAGE_NUMBER')['TEXT_LENGTH'])
 
 
-def page_raw_data():
+def page_raw_data(version):
     """Page 4: Raw Data Explorer"""
     st.markdown("## 🔍 Raw Data Explorer")
     st.markdown("*View raw data from database tables*")
     
-    traits_df = load_gwas_traits(st.session_state.selected_doc_id)
-    pages_df = load_document_pages(st.session_state.selected_doc_id)
-    documents = load_documents()
-    doc_info = documents[documents['DOCUMENT_ID'] == st.session_state.selected_doc_id].iloc[0]
+    traits_df = load_trait_details(st.session_state.selected_doc_id, version)
+    pages_df = load_all_document_pages(st.session_state.selected_doc_id, version)
+    documents = load_documents(version)
+    doc_info = documents.loc[st.session_state.selected_doc_id].to_dict()
     
     # GWAS Traits Table
     with st.expander("🧬 GWAS Traits Analytics", expanded=True):
@@ -812,10 +898,9 @@ def page_raw_data():
             st.dataframe(traits_df, use_container_width=True)
             
             # Download button
-            csv = traits_df.to_csv(index=False)
             st.download_button(
                 label="📥 Download Traits CSV",
-                data=csv,
+                data=get_traits_csv(st.session_state.selected_doc_id, version),
                 file_name=f"gwas_traits_{st.session_state.selected_doc_id[:8]}.csv",
                 mime="text/csv"
             )
@@ -828,10 +913,9 @@ def page_raw_data():
             st.dataframe(pages_df, use_container_width=True)
             
             # Download button
-            csv = pages_df.to_csv(index=False)
             st.download_button(
                 label="📥 Download Pages CSV",
-                data=csv,
+                data=get_pages_csv(st.session_state.selected_doc_id, version),
                 file_name=f"pages_{st.session_state.selected_doc_id[:8]}.csv",
                 mime="text/csv"
             )
@@ -849,7 +933,7 @@ def page_raw_data():
         })
 
 
-def page_chatbot():
+def page_chatbot(version):
     """Page 5: Ask Questions (Chatbot)"""
     st.markdown("## 🤖 Ask Questions About This Document")
     st.markdown("*Use AI to ask questions about the research paper and get answers with source citations*")
@@ -861,6 +945,11 @@ def page_chatbot():
     if "chat_model" not in st.session_state:
         st.session_state.chat_model = "mistral-large2"
     
+    # Search results per (document, context pages, question); reset when the document changes
+    if st.session_state.get("search_cache_doc_id") != st.session_state.selected_doc_id:
+        st.session_state.search_cache = {}
+        st.session_state.search_cache_doc_id = st.session_state.selected_doc_id
+    
     # Chat configuration
     with st.expander("⚙️ Chat Settings", expanded=False):
         col1, col2 = st.columns(2)
@@ -905,79 +994,20 @@ def page_chatbot():
             
             with st.spinner("Searching document and generating answer..."):
                 try:
-                    # Get Snowpark session
-                    session = get_active_session()
-                    
-                    # Step 1: Generate embeddings for the question using AI_EMBED
-                    question_clean = question.replace("'", "''")  # Escape for SQL
-                    
-                    embed_query = f"""
-                    SELECT 
-                        AI_EMBED('voyage-multimodal-3', '{question_clean}') as text_vector,
-                        AI_EMBED('voyage-multimodal-3', '{question_clean}') as image_vector
-                    """
-                    
-                    embedding_results = session.sql(embed_query).collect()
-                    
-                    # Convert embeddings to lists
-                    text_vector = embedding_results[0]['TEXT_VECTOR']
-                    image_vector = embedding_results[0]['IMAGE_VECTOR']
-                    
-                    # Convert to Python lists if needed
-                    if hasattr(text_vector, 'tolist'):
-                        text_vector = text_vector.tolist()
-                    elif not isinstance(text_vector, list):
-                        text_vector = list(text_vector)
-                    
-                    if hasattr(image_vector, 'tolist'):
-                        image_vector = image_vector.tolist()
-                    elif not isinstance(image_vector, list):
-                        image_vector = list(image_vector)
-                    
-                    # Step 2: Build multi_index_query (escape question for JSON)
-                    question_json = question.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
-                    
-                    # Convert vectors to JSON string
-                    text_vector_str = str(text_vector).replace("'", '"')
-                    image_vector_str = str(image_vector).replace("'", '"')
-                    
-                    # Build the search query with multi_index_query
-                    search_query = f"""
-                    SELECT 
-                        result.value:page_text::STRING AS page_text,
-                        result.value:page_number::INT AS page_number
-                    FROM TABLE(
-                        FLATTEN(
-                            PARSE_JSON(
-                                SNOWFLAKE.CORTEX.SEARCH_PREVIEW(
-                                    'GWAS.PDF_PROCESSING.MULTIMODAL_SEARCH_SERVICE',
-                                    '{{
-                                        "multi_index_query": {{
-                                            "page_text": {{"text": "{question_json}"}},
-                                            "text_embedding": {{"vector": {text_vector_str}}},
-                                            "image_embedding": {{"vector": {image_vector_str}}}
-                                        }},
-                                        "columns": ["page_text", "page_number"],
-                                        "limit": {num_chunks},
-                                        "filter": {{"@eq": {{"document_id": "{st.session_state.selected_doc_id}"}}}}
-                                    }}'
-                                )
-                            )['results']
+                    # Step 1-2: Vector search for relevant pages, reused for repeated questions
+                    question_hash = hashlib.blake2b(question.lower().strip().encode()).hexdigest()
+                    cache_key = (st.session_state.selected_doc_id, num_chunks, question_hash)
+                    search_cache = st.session_state.search_cache
+                    if cache_key in search_cache:
+                        # Re-insert so dict order stays least- to most-recently used
+                        search_cache[cache_key] = search_cache.pop(cache_key)
+                    else:
+                        search_cache[cache_key] = search_document_context(
+                            question, st.session_state.selected_doc_id, num_chunks
                         )
-                    ) AS result
-                    """
-                    
-                    search_results = session.sql(search_query).collect()
-                    
-                    # Build context from search results
-                    context_str = ""
-                    page_refs = []
-                    for result in search_results:
-                        page_num = result['PAGE_NUMBER'] if result['PAGE_NUMBER'] else 'Unknown'
-                        page_text = result['PAGE_TEXT'] if result['PAGE_TEXT'] else ''
-                        context_str += f"[Page {page_num}]: {page_text}\n\n"
-                        if page_num not in page_refs and page_num != 'Unknown':
-                            page_refs.append(page_num)
+                        while len(search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                            del search_cache[next(iter(search_cache))]
+                    context_str, page_refs_str = search_cache[cache_key]
                     
                     # Create prompt for LLM
                     prompt = f"""[INST]
@@ -1000,20 +1030,16 @@ Instructions:
 [/INST]
 Answer:"""
                     
-                    # Generate response using Cortex LLM via SQL
-                    prompt_escaped = prompt.replace("'", "''")
-                    llm_query = f"""
-                    SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                        '{st.session_state.chat_model}',
-                        '{prompt_escaped}'
-                    ) as response
-                    """
-                    llm_result = session.sql(llm_query).collect()
-                    response = llm_result[0]['RESPONSE'] if llm_result else "Sorry, I couldn't generate a response."
+                    # Stream the response from the Cortex LLM as it is generated
+                    response = ""
+                    for text in stream_cortex_complete(st.session_state.chat_model, prompt):
+                        response += text
+                        message_placeholder.markdown(response + "▌")
+                    if not response:
+                        response = "Sorry, I couldn't generate a response."
                     
                     # Format response with citations
-                    if page_refs:
-                        page_refs_str = ", ".join([f"Page {p}" for p in sorted(page_refs)])
+                    if page_refs_str:
                         response_with_refs = f"{response}\n\n**📄 Sources:** {page_refs_str}"
                     else:
                         response_with_refs = response
@@ -1090,11 +1116,14 @@ def main():
     # Add separator before document selector
     st.sidebar.markdown("---")
     
+    # One data version per rerun, shared by the sidebar and the page
+    version = data_version()
+    
     # Render shared document selector (now below navigation)
-    doc_info = render_document_selector()
+    doc_info = render_document_selector(version)
     
     # Render selected page
-    pages[selected_page]()
+    pages[selected_page](version)
     
     # Footer
     st.markdown("---")
@@ -1105,6 +1134,9 @@ def main():
         <p style="font-size: 0.9rem;">Built with ❤️ using snowflake-arctic-embed-l-v2.0-8k & voyage-multimodal-3</p>
     </div>
     """, unsafe_allow_html=True)
+    
+    # Most users pick a recent document; have its traits cached before they do
+    prefetch_documents(version)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,124 @@
+"""Unit tests for the Streamlit app's pure helpers (streamlit_app/helpers.py)."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers import TRAIT_FIELDS, found_trait_mask, iter_sse_text
+
+
+def make_row(dtype=object, **values):
+    """A trait row with every field NOT_FOUND except the ones given"""
+    row = dict.fromkeys(TRAIT_FIELDS, "NOT_FOUND")
+    row.update(values)
+    return pd.Series(row, dtype=dtype)
+
+
+# =============================
+# found_trait_mask
+# =============================
+
+@pytest.mark.parametrize("dtype", [object, "string[python]", "string[pyarrow]"])
+def test_found_trait_mask_counts_real_values(dtype):
+    row = make_row(dtype, TRAIT="Plant height", GENE="Zm00001d012345", CHROMOSOME="5")
+
+    mask = found_trait_mask(row)
+
+    assert mask.dtype == bool
+    assert list(mask.index) == list(TRAIT_FIELDS)
+    assert set(mask[mask].index) == {"TRAIT", "GENE", "CHROMOSOME"}
+
+
+@pytest.mark.parametrize("value", ["NOT_FOUND", "not found", "NotFound", "Not-Found", "'NOT_FOUND'"])
+def test_found_trait_mask_rejects_not_found_markers(value):
+    assert not found_trait_mask(make_row(TRAIT=value))["TRAIT"]
+
+
+@pytest.mark.parametrize("value", ["None", "NULL", "not in paper", '"NONE"'])
+def test_found_trait_mask_rejects_placeholders(value):
+    assert not found_trait_mask(make_row(TRAIT=value))["TRAIT"]
+
+
+@pytest.mark.parametrize("value", [None, np.nan, pd.NA, "", "''", '""'])
+def test_found_trait_mask_rejects_missing_and_empty(value):
+    assert not found_trait_mask(make_row(TRAIT=value))["TRAIT"]
+
+
+def test_found_trait_mask_strips_quotes_before_matching():
+    assert found_trait_mask(make_row(GENE='"TaGW2"'))["GENE"]
+
+
+def test_found_trait_mask_counts_numeric_values():
+    assert found_trait_mask(make_row(EFFECT_SIZE=0.35, PHYSICAL_POSITION=0))[
+        ["EFFECT_SIZE", "PHYSICAL_POSITION"]
+    ].all()
+
+
+def test_found_trait_mask_treats_absent_columns_as_not_found():
+    row = pd.Series({"TRAIT": "Grain yield", "DOCUMENT_ID": "abc"})
+
+    mask = found_trait_mask(row)
+
+    assert list(mask.index) == list(TRAIT_FIELDS)
+    assert mask.sum() == 1 and mask["TRAIT"]
+
+
+# =============================
+# iter_sse_text
+# =============================
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}"
+
+
+def test_iter_sse_text_yields_deltas_until_done():
+    lines = [
+        sse({"choices": [{"delta": {"content": "Hello"}}]}),
+        sse({"choices": [{"delta": {"content": ", world"}}]}),
+        "data: [DONE]",
+        sse({"choices": [{"delta": {"content": "ignored"}}]}),
+    ]
+
+    assert list(iter_sse_text(lines)) == ["Hello", ", world"]
+
+
+def test_iter_sse_text_skips_blank_comment_and_non_data_lines():
+    lines = [
+        "",
+        None,
+        ": keep-alive",
+        "event: message",
+        "id: 1",
+        sse({"choices": [{"delta": {"content": "ok"}}]}),
+    ]
+
+    assert list(iter_sse_text(lines)) == ["ok"]
+
+
+def test_iter_sse_text_reads_text_deltas():
+    lines = [sse({"choices": [{"delta": {"text": "from text"}}]})]
+
+    assert list(iter_sse_text(lines)) == ["from text"]
+
+
+def test_iter_sse_text_skips_events_without_text():
+    lines = [
+        sse({"choices": []}),
+        sse({"usage": {"total_tokens": 3}}),
+        sse({"choices": [{"delta": {}}]}),
+        sse({"choices": [{"delta": {"content": ""}}]}),
+        sse({"choices": [{"delta": {"content": "done"}}]}),
+    ]
+
+    assert list(iter_sse_text(lines)) == ["done"]
+
+
+def test_iter_sse_text_accepts_data_without_space():
+    assert list(iter_sse_text(['data:{"choices":[{"delta":{"content":"x"}}]}'])) == ["x"]
+
+
+def test_iter_sse_text_raises_on_invalid_json():
+    with pytest.raises(ValueError):
+        list(iter_sse_text(["data: {not json"]))